@@ -3,64 +3,178 @@
 import asyncio
 import json
 import logging
+import random
 import time
 from urllib.parse import urlencode
 
 import aiohttp
 import async_timeout
+import yarl
+
+try:
+    import orjson
+    json_loads = orjson.loads  # pylint: disable=no-member
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+    except ImportError:
+        json_loads = json.loads
 
 DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_CONCURRENCY = 10
 API_ENDPOINT = 'https://api.ambiclimate.com/api/v1/'
+BASE_DELAY = 1.0
+MAX_DELAY = 30
+JITTER = 0.5
+
+VALID_COMFORT_FEEDBACK = frozenset({'too_hot', 'too_warm', 'bit_warm',
+                                    'comfortable', 'bit_cold', 'too_cold',
+                                    'freezing'})
+
+# Read-only endpoints safe to cache, with per-endpoint TTL in seconds.
+CACHEABLE_COMMANDS = {'device/sensor/temperature': 5.0,
+                      'device/sensor/humidity': 5.0,
+                      'device/mode': 5.0,
+                      'device/ir_feature': 5.0}
+
+# Commands that change device state and must bust cached reads.
+MUTATING_COMMANDS = frozenset({'device/power/off',
+                               'device/mode/comfort',
+                               'device/mode/temperature',
+                               'device/mode/away_temperature_lower',
+                               'device/mode/away_temperature_upper',
+                               'device/mode/away_humidity_upper',
+                               'device/deployments'})
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class AmbiclimateConnection:
     """Class to comunicate with the Ambiclimate api."""
+    # pylint: disable=too-many-instance-attributes
+
+    __slots__ = ('websession', '_connector', '_owns_session', '_timeout',
+                 'oauth', '_token_info', '_headers', '_devices',
+                 '_devices_cache_ts', '_devices_ttl', '_cache', '_sem',
+                 '_base_url')
 
     def __init__(self, oauth, token_info,
                  timeout=DEFAULT_TIMEOUT,
-                 websession=None):
-        """Initialize the Ambiclimate connection."""
-        if websession is None:
-            async def _create_session():
-                return aiohttp.ClientSession()
-
-            loop = asyncio.get_event_loop()
-            self.websession = loop.run_until_complete(_create_session())
-        else:
-            self.websession = websession
-        self._timeout = timeout
+                 websession=None,
+                 connector=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        # pylint: disable=too-many-arguments, too-many-positional-arguments
+        """Initialize the Ambiclimate connection.
+
+        max_concurrency is the upper bound on parallel API calls; extra
+        requests wait instead of piling up in the connector queue.
+        """
+        self.websession = websession
+        self._connector = connector
+        self._owns_session = websession is None
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
         self.oauth = oauth
         self.token_info = token_info
         self._devices = []
+        self._devices_cache_ts = 0.0
+        self._devices_ttl = 60.0
+        self._cache = {}
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._base_url = yarl.URL(API_ENDPOINT)
 
-    async def request(self, command, params, retry=3, get=True):
-        """Request data."""
-        headers = {
+    @property
+    def token_info(self):
+        """Return the current token info."""
+        return self._token_info
+
+    @token_info.setter
+    def token_info(self, token_info):
+        """Set token info and precompute the request headers."""
+        self._token_info = token_info
+        self._headers = {
             "Accept": "application/json",
-            'Authorization': 'Bearer ' + self.token_info.get('access_token')
+            'Authorization': 'Bearer ' + token_info.get('access_token')
         }
 
-        url = API_ENDPOINT + command
-        try:
-            with async_timeout.timeout(self._timeout):
-                if get:
-                    resp = await self.websession.get(url, headers=headers, params=params)
-                else:
-                    resp = await self.websession.post(url, headers=headers, json=params)
-        except asyncio.TimeoutError:
-            if retry < 1:
-                _LOGGER.error("Timed out sending command to Ambiclimate: %s", command)
+    async def _get_session(self):
+        """Get the aiohttp session, creating it in the running loop if needed."""
+        if self.websession is None or self.websession.closed:
+            connector = self._connector
+            owns_connector = connector is None or connector.closed
+            if owns_connector:
+                connector = aiohttp.TCPConnector(limit=32,
+                                                 limit_per_host=16,
+                                                 ttl_dns_cache=300,
+                                                 use_dns_cache=True,
+                                                 keepalive_timeout=75,
+                                                 enable_cleanup_closed=True)
+            self.websession = aiohttp.ClientSession(connector=connector,
+                                                    connector_owner=owns_connector)
+            self._owns_session = True
+        return self.websession
+
+    async def close(self):
+        """Close the aiohttp session if this instance created it."""
+        if self._owns_session and self.websession is not None:
+            await self.websession.close()
+            self.websession = None
+
+    async def __aenter__(self):
+        """Enter async context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Exit async context."""
+        await self.close()
+
+    async def request(self, command, params, retry=3, get=True):
+        """Request data."""
+        # pylint: disable=too-many-locals
+        headers = self._headers
+        url = self._base_url / command
+        cache_ttl = CACHEABLE_COMMANDS.get(command) if get else None
+        cache_key = (command, params.get('room_name'), params.get('location_name'))
+        if cache_ttl is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < cache_ttl:
+                return cached[1]
+        session = await self._get_session()
+        for attempt in range(retry + 1):
+            if attempt:
+                delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * (1 + random.random() * JITTER))
+            try:
+                async with self._sem:
+                    if get:
+                        request = session.get(url, headers=headers, params=params,
+                                              timeout=self._timeout)
+                    else:
+                        request = session.post(url, headers=headers, json=params,
+                                               timeout=self._timeout)
+                    async with request as resp:
+                        if 400 <= resp.status < 500 and resp.status != 429:
+                            _LOGGER.error(await resp.text())
+                            return None
+                        if resp.status != 200:
+                            _LOGGER.warning("Ambiclimate returned %s for %s",
+                                            resp.status, command)
+                            continue
+                        result = await resp.text()
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+                continue
+            except aiohttp.ClientError:
+                _LOGGER.error("Error sending command to Ambiclimate: %s", command, exc_info=True)
                 return None
-            return await self.request(command, params, retry - 1, get)
-        except aiohttp.ClientError:
-            _LOGGER.error("Error sending command to Ambiclimate: %s", command, exc_info=True)
-            return None
-        if resp.status != 200:
-            _LOGGER.error(await resp.text())
-            return None
-        return await resp.text()
+            if cache_ttl is not None:
+                self._cache[cache_key] = (time.monotonic(), result)
+            elif command in MUTATING_COMMANDS:
+                self._cache = {key: value for key, value in self._cache.items()
+                               if key[1:] != cache_key[1:]}
+            return result
+        _LOGGER.error("Failed sending command to Ambiclimate "
+                      "after %s attempts: %s", retry + 1, command)
+        return None
 
     def find_device_by_room_name(self, room_name):
         """Get device by room name."""
@@ -71,23 +185,68 @@ class AmbiclimateConnection:
 
     async def find_devices(self):
         """Get users Ambi Climate device information."""
+        if (self._devices
+                and time.monotonic() - self._devices_cache_ts < self._devices_ttl):
+            return True
         res = await self.request('devices', {})
         if not res:
             return False
-        res = json.loads(res)
+        res = json_loads(res)
         self._devices = []
         for device in res.get('data', []):
             self._devices.append(AmbiclimateDevice(device.get('room_name'),
                                                    device.get('location_name'),
                                                    device.get('device_id'),
                                                    self))
-
+        self._devices_cache_ts = time.monotonic()
         return bool(self._devices)
 
+    def invalidate_devices(self):
+        """Force the next find_devices call to hit the API."""
+        self._devices_cache_ts = 0.0
+
     def get_devices(self):
         """Get users Ambi Climate device information."""
         return self._devices
 
+    async def snapshot_all_devices(self, limit=16):
+        """Get sensor snapshots for all devices concurrently."""
+        sem = asyncio.Semaphore(limit)
+
+        async def _snapshot(device):
+            async with sem:
+                return await device.get_all_sensors()
+
+        snapshots = await asyncio.gather(*(_snapshot(device)
+                                           for device in self._devices))
+        return {device.device_id: snapshot
+                for device, snapshot in zip(self._devices, snapshots)}
+
+    async def apply_to_devices(self, command, devices=None, params=None,
+                               get=True, batch_size=None):
+        """Apply one command to several devices concurrently.
+
+        Fans out one request per device with asyncio.gather; outbound
+        concurrency stays bounded by the request semaphore. batch_size
+        optionally limits how many requests are in flight at once.
+        Returns one result per device, with exceptions in place of
+        results for devices that failed.
+        """
+        devices = self.get_devices() if devices is None else devices
+        params = {} if params is None else params
+        if not devices:
+            return []
+        if batch_size is None or batch_size <= 0:
+            batch_size = len(devices)
+        results = []
+        for start in range(0, len(devices), batch_size):
+            batch = devices[start:start + batch_size]
+            results.extend(await asyncio.gather(
+                *(device.request(command, dict(params), get=get)
+                  for device in batch),
+                return_exceptions=True))
+        return results
+
     async def refresh_access_token(self):
         """Refresh access token."""
         token_info = await self.oauth.refresh_access_token(self.token_info)
@@ -99,13 +258,18 @@ class AmbiclimateConnection:
 
 class AmbiclimateDevice:
     """Instance of Ambiclimate device."""
-    # pylint: disable=too-many-public-methods
+    # pylint: disable=too-many-public-methods, too-many-instance-attributes
+
+    __slots__ = ('_room_name', '_location_name', '_device_id', '_base_params',
+                 'control', 'ir_features', 'ac_data', '_mode')
 
     def __init__(self, room_name, location_name, device_id, ambiclimate_control):
         """Initialize the Ambiclimate device class."""
         self._room_name = room_name
         self._location_name = location_name
         self._device_id = device_id
+        self._base_params = {'room_name': room_name,
+                             'location_name': location_name}
         self.control = ambiclimate_control
         self.ir_features = None
         self.ac_data = None
@@ -123,13 +287,14 @@ class AmbiclimateDevice:
 
     async def request(self, command, params, retry=3, get=True):
         """Request data."""
+        params = {**self._base_params, **params}
         if 'multiple' in params:
             params['multiple'] = 'True' if params['multiple'] else 'False'
-        params['room_name'] = self._room_name
-        params['location_name'] = self._location_name
         res = await self.control.request(command, params, retry, get)
+        if res is None:
+            return None
         try:
-            res = json.loads(res)
+            res = json_loads(res)
             if isinstance(res, dict) and res.get('error'):
                 _LOGGER.error(res.get('error'))
             return res
@@ -152,9 +317,7 @@ class AmbiclimateDevice:
 
     async def set_comfort_feedback(self, value):
         """Send feedback for Comfort mode."""
-        valid_comfort_feedback = ['too_hot', 'too_warm', 'bit_warm', 'comfortable',
-                                  'bit_cold', 'too_cold', 'freezing']
-        if value not in valid_comfort_feedback:
+        if value not in VALID_COMFORT_FEEDBACK:
             _LOGGER.error("Invalid comfort feedback")
             return
         return await self.request('user/feedback', {'value': value})
@@ -205,6 +368,19 @@ class AmbiclimateDevice:
         """Get Ambi Climate's appliance IR feature."""
         return await self.request('device/ir_feature', {})
 
+    async def get_all_sensors(self):
+        """Get all sensor data concurrently instead of one round-trip each."""
+        temperature, humidity, mode, ir_feature = await asyncio.gather(
+            self.get_sensor_temperature(),
+            self.get_sensor_humidity(),
+            self.get_mode(),
+            self.get_ir_feature(),
+            return_exceptions=True)
+        return {'temperature': None if isinstance(temperature, Exception) else temperature,
+                'humidity': None if isinstance(humidity, Exception) else humidity,
+                'mode': None if isinstance(mode, Exception) else mode,
+                'ir_feature': None if isinstance(ir_feature, Exception) else ir_feature}
+
     async def get_appliance_states(self, limit=1, offset=0):
         """Get Ambi Climate's last N appliance states."""
         return await self.request('device/appliance_states',